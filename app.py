@@ -1,17 +1,58 @@
 import streamlit as st
 import pandas as pd
-import tempfile
-import os
+import logging
+import concurrent.futures
+import multiprocessing
 from dotenv import load_dotenv
 
+# Configure logging once at the application entrypoint; the utils
+# modules only create their own loggers
+logging.basicConfig(level=logging.INFO)
+
 # Import our utility modules
-from utils.pdf_processor import extract_text_from_pdf
-from utils.ai_extractor import extract_shipping_data
+from utils.pdf_processor import extract_text_from_pdf_bytes
+from utils.ai_extractor import extract_shipping_data, extract_shipping_data_batch
 from utils.excel_exporter import create_excel_file, create_multiple_records_excel, generate_filename
+from utils.cache import make_key, cache_get, cache_put
 
 # Load environment variables
 load_dotenv()
 
+# Finished records are cached on PDF content, so a re-uploaded file
+# skips the whole pipeline - even across sessions, which st.cache_data
+# cannot do
+def _cache_get(file_bytes):
+    return cache_get("records", make_key([file_bytes]))
+
+def _cache_put(file_bytes, extracted_data):
+    cache_put("records", make_key([file_bytes]), extracted_data)
+
+def _process_pdf(file_bytes):
+    """
+    Extract text and shipping data from raw PDF bytes.
+    """
+    cached = _cache_get(file_bytes)
+    if cached is not None:
+        return cached
+
+    # Process PDF directly from memory, no temp file needed
+    pdf_text = extract_text_from_pdf_bytes(file_bytes)
+    extracted_data = extract_shipping_data(pdf_text)
+    _cache_put(file_bytes, extracted_data)
+    return extracted_data
+
+@st.cache_data(show_spinner=False)
+def process_pdf_bytes(file_bytes):
+    """
+    Cached wrapper around _process_pdf.
+
+    Cached by Streamlit on the file content, so reruns of the script
+    (button clicks, widget changes, re-uploads of the same file) reuse
+    the previous result instead of re-parsing the PDF and re-calling
+    the Anthropic API.
+    """
+    return _process_pdf(file_bytes)
+
 # Set up page configuration
 st.set_page_config(
     page_title="Shipping Data Extractor",
@@ -51,15 +92,9 @@ if upload_option == "Single PDF":
         if process_button:
             with st.spinner("Processing PDF... This may take a moment."):
                 try:
-                    # Create temporary file
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                        tmp_file.write(uploaded_file.getvalue())
-                        pdf_path = tmp_file.name
-                    
-                    # Process PDF
-                    pdf_text = extract_text_from_pdf(pdf_path)
-                    extracted_data = extract_shipping_data(pdf_text)
-                    
+                    # Process PDF (cached on file content across reruns)
+                    extracted_data = process_pdf_bytes(uploaded_file.getvalue())
+
                     # Display results
                     st.subheader("Extracted Shipping Data")
                     df = pd.DataFrame([extracted_data])
@@ -76,11 +111,6 @@ if upload_option == "Single PDF":
                 
                 except Exception as e:
                     st.error(f"An error occurred: {str(e)}")
-                
-                finally:
-                    # Cleanup
-                    if 'pdf_path' in locals() and os.path.exists(pdf_path):
-                        os.unlink(pdf_path)
 
 else:  # Multiple PDFs
     uploaded_files = st.file_uploader("Upload PDF files", type=['pdf'], accept_multiple_files=True)
@@ -90,33 +120,63 @@ else:  # Multiple PDFs
         if process_button:
             with st.spinner("Processing PDFs... This may take a moment."):
                 all_extracted_data = []
-                
+
                 progress_bar = st.progress(0)
                 status_text = st.empty()
-                
-                for i, uploaded_file in enumerate(uploaded_files):
-                    try:
+
+                file_names = [f.name for f in uploaded_files]
+                file_bytes_list = [f.getvalue() for f in uploaded_files]
+                pdf_texts = [None] * len(uploaded_files)
+
+                # Serve previously processed files straight from the cache
+                pending = []
+                for i, file_bytes in enumerate(file_bytes_list):
+                    cached = _cache_get(file_bytes)
+                    if cached is not None:
+                        cached['File Name'] = file_names[i]
+                        all_extracted_data.append(cached)
+                    else:
+                        pending.append(i)
+
+                # Stage 1: extract text from the remaining PDFs in
+                # parallel worker processes - pdfplumber parsing is
+                # CPU-bound, so threads would serialize on the GIL.
+                # Spawned (not forked) workers keep Streamlit's script
+                # thread state out of the children.
+                with concurrent.futures.ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    futures = {
+                        executor.submit(extract_text_from_pdf_bytes, file_bytes_list[i]): i
+                        for i in pending
+                    }
+
+                    completed = 0
+                    for future in concurrent.futures.as_completed(futures):
+                        index = futures[future]
+                        completed += 1
+                        try:
+                            pdf_texts[index] = future.result()
+                        except Exception as e:
+                            st.error(f"Error processing {file_names[index]}: {str(e)}")
+
                         # Update progress
-                        progress = (i + 1) / len(uploaded_files)
-                        progress_bar.progress(progress)
-                        status_text.text(f"Processing file {i + 1} of {len(uploaded_files)}: {uploaded_file.name}")
-                        
-                        # Create temporary file
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-                            tmp_file.write(uploaded_file.getvalue())
-                            pdf_path = tmp_file.name
-                        
-                        # Process PDF
-                        pdf_text = extract_text_from_pdf(pdf_path)
-                        extracted_data = extract_shipping_data(pdf_text)
-                        extracted_data['File Name'] = uploaded_file.name
-                        all_extracted_data.append(extracted_data)
-                        
-                        # Cleanup
-                        os.unlink(pdf_path)
-                    
+                        progress_bar.progress(completed / len(pending))
+                        status_text.text(f"Read {completed} of {len(pending)} files")
+
+                # Stage 2: extract shipping data from all texts with a
+                # single batched Anthropic request
+                readable = [(i, text) for i, text in enumerate(pdf_texts) if text is not None]
+                if readable:
+                    status_text.text("Extracting shipping data...")
+                    try:
+                        records = extract_shipping_data_batch([text for _, text in readable])
+                        for (index, _), extracted_data in zip(readable, records):
+                            _cache_put(file_bytes_list[index], dict(extracted_data))
+                            extracted_data['File Name'] = file_names[index]
+                            all_extracted_data.append(extracted_data)
                     except Exception as e:
-                        st.error(f"Error processing {uploaded_file.name}: {str(e)}")
+                        st.error(f"Error extracting shipping data: {str(e)}")
                 
                 # Display results
                 if all_extracted_data:
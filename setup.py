@@ -8,8 +8,9 @@ setup(
     install_requires=[
         "streamlit>=1.24.0",
         "pandas>=1.5.0",
-        "openpyxl>=3.0.10",
-        "pdfplumber>=0.9.0",
+        "xlsxwriter>=3.0.0",
+        "pdfplumber>=0.10.0",
+        "pypdf>=3.9.0",
         "anthropic>=0.7.0",
         "python-dotenv>=1.0.0",
     ],
@@ -1,7 +1,7 @@
 import os
 import pytest
-from utils.pdf_processor import extract_text_from_pdf
-from utils.ai_extractor import init_ai_client, extract_shipping_data
+from utils.pdf_processor import extract_text_from_pdf, preprocess_text
+from utils.ai_extractor import init_ai_client, extract_shipping_data, extract_json_from_text, parse_text_response
 from utils.excel_exporter import generate_filename
 
 def test_environment_variables():
@@ -14,6 +14,45 @@ def test_generate_filename():
     assert filename.endswith(".xlsx"), "Filename should end with .xlsx"
     assert "shipping_data_" in filename, "Filename should contain 'shipping_data_'"
 
+def test_preprocess_text():
+    """Test text preprocessing keeps lines but normalizes whitespace"""
+    raw = "Order ID:   12345\tX\n\n\n\n\nName|Value\n"
+    processed = preprocess_text(raw)
+    assert processed == "Order ID: 12345 X\n\nName | Value"
+
+def test_extract_json_from_text():
+    """Test JSON extraction from text with surrounding content"""
+    text = 'Here is the data:\n```json\n{"Order ID": "12345", "Courier Name": "FastShip"}\n```\nDone.'
+    data = extract_json_from_text(text)
+    assert data == {"Order ID": "12345", "Courier Name": "FastShip"}
+
+    nested = 'Result: {"Order ID": "12345", "Details": {"Courier Name": "FastShip"}} extra'
+    data = extract_json_from_text(nested)
+    assert data["Details"]["Courier Name"] == "FastShip"
+
+    assert extract_json_from_text("no json here") is None
+
+def test_parse_text_response():
+    """Test fallback parsing of non-JSON responses"""
+    text = """
+    Order ID: 12345
+    Recipient Name: John Doe
+    Delivery Address: 123 Main St, City, Country
+    Carrier: FastShip Express
+    Tracking Number: ABC123XYZ
+    """
+    data = parse_text_response(text)
+    assert data["Order ID"] == "12345"
+    assert data["Recipient Name"] == "John Doe"
+    assert data["Recipient Address"] == "123 Main St, City, Country"
+    assert data["Courier Name"] == "FastShip Express"
+    assert data["Tracking Number"] == "ABC123XYZ"
+
+    # Missing fields should default to "Not Found"
+    data = parse_text_response("Order ID: 99")
+    assert data["Order ID"] == "99"
+    assert data["Courier Name"] == "Not Found"
+
 def test_ai_client_initialization():
     """Test Anthropic client initialization"""
     try:
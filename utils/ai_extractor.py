@@ -2,20 +2,119 @@ import os
 import re
 import json
 import logging
-from anthropic import Anthropic
+import functools
 from dotenv import load_dotenv
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from utils.cache import disk_cached
+
 logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+# Model used for extraction requests. Haiku is plenty for pulling five
+# labelled fields out of a short document and is several times faster
+# (and ~10x cheaper) than Opus; override via ANTHROPIC_MODEL if needed.
+MODEL = os.getenv("ANTHROPIC_MODEL", "claude-haiku-4-5")
+
+# System prompt is identical for every extraction, so build it once at
+# import time instead of on each call
+SYSTEM_PROMPT = """You are an AI assistant specialized in extracting shipping information from courier airway bills.
+
+IMPORTANT: Your response must be a valid JSON object only, with no text before or after.
+Do not include markdown code blocks or explanations."""
+
+# User prompt preamble is likewise fixed; only the airway bill text
+# changes between calls
+USER_PROMPT_TEMPLATE = """Please extract the following information from this courier airway bill text and return it as a JSON object:
+- Order ID
+- Recipient Name
+- Recipient Address
+- Courier Name
+- Tracking Number
+
+If any field cannot be found, label it as "Not Found".
+
+Here is the text from the courier airway bill:
+
+{pdf_text}"""
+
+# Prompts for batched extraction of several airway bills in one request
+BATCH_SYSTEM_PROMPT = """You are an AI assistant specialized in extracting shipping information from courier airway bills.
+
+IMPORTANT: Your response must be a valid JSON array only, with no text before or after.
+The array must contain exactly one JSON object per document, in document order.
+Do not include markdown code blocks or explanations."""
+
+BATCH_USER_PROMPT_TEMPLATE = """Please extract the following information from each courier airway bill below and return a JSON array with one object per document, in document order:
+- Order ID
+- Recipient Name
+- Recipient Address
+- Courier Name
+- Tracking Number
+
+If any field cannot be found in a document, label it as "Not Found".
+
+{documents}"""
+
+# Fields every extracted record must contain
+REQUIRED_FIELDS = ["Order ID", "Recipient Name", "Recipient Address", "Courier Name", "Tracking Number"]
+
+# One compiled "label: value" pattern covering every field alias, so a
+# fallback response is scanned in a single pass instead of checking
+# each alias against each line
+_FIELD_LABEL_RE = re.compile(r"""(?imx)
+    ^\W*                        # leading bullets, quotes or whitespace
+    (?:
+        (?P<order_id>order\s*(?:id|number|\#)|id)
+      | (?P<recipient_name>recipient\s*name|receiver\s*name|consignee|to)
+      | (?P<recipient_address>recipient\s*address|delivery\s*address|shipping\s*address|destination)
+      | (?P<courier_name>courier\s*name|carrier|shipping\s*company|delivery\s*service)
+      | (?P<tracking_number>tracking\s*(?:number|\#|id)|awb|airway\s*bill)
+    )
+    \s*[:\-]\s*
+    (?P<value>.+?)\s*$
+""")
+
+def _loads(text):
+    """
+    Parse a complete JSON document, using orjson when it is installed.
+
+    Only full-document parsing goes through orjson; the incremental
+    scans in extract_json_from_text keep stdlib raw_decode, which
+    orjson does not offer. orjson.JSONDecodeError subclasses
+    json.JSONDecodeError, so existing except clauses are unaffected.
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+# Maps the regex group that matched to the record field it fills
+_FIELD_GROUPS = {
+    "order_id": "Order ID",
+    "recipient_name": "Recipient Name",
+    "recipient_address": "Recipient Address",
+    "courier_name": "Courier Name",
+    "tracking_number": "Tracking Number",
+}
+
+@functools.lru_cache(maxsize=1)
 def init_ai_client():
     """
     Initialize Anthropic AI client.
+
+    Cached so every extraction reuses one client (and its HTTP
+    connection pool) instead of paying TLS/TCP setup per call.
     """
+    # Deferred import: the anthropic package is heavy and only needed
+    # once a request is actually made
+    from anthropic import Anthropic
+
     try:
         anthropic_key = os.getenv("ANTHROPIC_API_KEY")
         if not anthropic_key:
@@ -36,41 +135,55 @@ def extract_json_from_text(text):
     Returns:
         dict: Extracted JSON object or None if extraction fails
     """
-    # Try to find JSON between curly braces
-    matches = re.findall(r'\{.*?\}', text, re.DOTALL)
-    
-    if matches:
-        for match in matches:
-            try:
-                return json.loads(match)
-            except json.JSONDecodeError:
-                continue
-    
-    # Try standard method to extract from markdown code blocks
-    if "```json" in text:
-        parts = text.split("```json")
-        if len(parts) > 1:
-            json_candidate = parts[1].split("```")[0].strip()
-            try:
-                return json.loads(json_candidate)
-            except json.JSONDecodeError:
-                pass
-    
-    if "```" in text:
-        parts = text.split("```")
-        if len(parts) > 1:
-            json_candidate = parts[1].strip()
-            try:
-                return json.loads(json_candidate)
-            except json.JSONDecodeError:
-                pass
-    
+    # Fast path: if the model fenced its output in a ```json block,
+    # narrow the scan to that block's contents
+    fenced = text.partition('```json')[2].partition('```')[0]
+    if fenced.strip():
+        text = fenced
+
+    # Try raw_decode at each '{' until one parses - a single linear
+    # scan that handles nested braces and markdown code blocks alike,
+    # unlike a regex over candidate substrings
+    decoder = json.JSONDecoder()
+    index = text.find('{')
+    while index != -1:
+        try:
+            parsed, _ = decoder.raw_decode(text, index)
+            return parsed
+        except json.JSONDecodeError:
+            index = text.find('{', index + 1)
+
     return None
 
+def _try_parse_first_object(text):
+    """
+    Parse the JSON object starting at the first '{', or return None.
+
+    Unlike extract_json_from_text this never falls back to inner
+    braces, so a partially streamed outer object is not mistaken for a
+    complete nested one.
+    """
+    start = text.find('{')
+    if start == -1:
+        return None
+    try:
+        parsed, _ = json.JSONDecoder().raw_decode(text, start)
+        return parsed
+    except json.JSONDecodeError:
+        return None
+
+def _extraction_cache_key(pdf_text):
+    """
+    Fingerprint an extraction by its prompts and model, so cached
+    responses are invalidated when either changes.
+    """
+    return [MODEL, SYSTEM_PROMPT, USER_PROMPT_TEMPLATE, pdf_text]
+
+@disk_cached("ai_response", _extraction_cache_key)
 def extract_shipping_data(pdf_text):
     """
     Extract shipping information from PDF text using Anthropic AI.
-    
+
     Args:
         pdf_text (str): Text extracted from the PDF
         
@@ -81,110 +194,189 @@ def extract_shipping_data(pdf_text):
     
     try:
         client = init_ai_client()
-        
-        # Create system prompt
-        system_prompt = """You are an AI assistant specialized in extracting shipping information from courier airway bills.
-        
-IMPORTANT: Your response must be a valid JSON object only, with no text before or after.
-Do not include markdown code blocks or explanations."""
 
         # Create user prompt
-        user_prompt = f"""Please extract the following information from this courier airway bill text and return it as a JSON object:
-- Order ID
-- Recipient Name
-- Recipient Address
-- Courier Name
-- Tracking Number
-
-If any field cannot be found, label it as "Not Found".
+        user_prompt = USER_PROMPT_TEMPLATE.format(pdf_text=pdf_text)
 
-Here is the text from the courier airway bill:
+        # Stream the response so we can stop as soon as the JSON object
+        # closes instead of waiting for the request to fully finish
+        with client.messages.stream(
+            model=MODEL,
+            max_tokens=1000,
+            # cache_control lets the API reuse the prefilled system
+            # prompt across requests instead of reprocessing it
+            system=[{
+                "type": "text",
+                "text": SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
+            messages=[{
+                "role": "user",
+                "content": user_prompt
+            }]
+        ) as stream:
+            parts = []
+            for text in stream.text_stream:
+                parts.append(text)
+                # A '}' may have completed the top-level object; leaving
+                # the with-block aborts the rest of the stream
+                if '}' in text:
+                    parsed = _try_parse_first_object("".join(parts))
+                    if parsed is not None:
+                        return parsed
 
-{pdf_text}"""
+        # Stream ended without a cleanly parseable object; run the full
+        # fallback chain on everything we received
+        return parse_ai_response("".join(parts))
         
-        # Create the message with proper Anthropic format
+    except Exception as e:
+        logger.error(f"Anthropic extraction error: {str(e)}")
+        raise
+
+def extract_json_array_from_text(text):
+    """
+    Attempt to extract a valid JSON array from text that might have extra content.
+
+    Args:
+        text (str): Text that may contain a JSON array
+
+    Returns:
+        list: Extracted JSON array or None if extraction fails
+    """
+    decoder = json.JSONDecoder()
+    index = text.find('[')
+    while index != -1:
+        try:
+            parsed, _ = decoder.raw_decode(text, index)
+            return parsed
+        except json.JSONDecodeError:
+            index = text.find('[', index + 1)
+
+    return None
+
+def extract_shipping_data_batch(pdf_texts):
+    """
+    Extract shipping information from several PDF texts with one AI request.
+
+    Batching amortizes the network round-trip and prompt prefill over
+    all documents instead of paying them once per airway bill.
+
+    Args:
+        pdf_texts (list): Text extracted from each PDF
+
+    Returns:
+        list: One dict of extracted shipping information per input text,
+            in input order
+    """
+    if not pdf_texts:
+        return []
+    if len(pdf_texts) == 1:
+        return [extract_shipping_data(pdf_texts[0])]
+
+    logger.info(f"Sending batched request to Anthropic AI for {len(pdf_texts)} documents")
+
+    try:
+        client = init_ai_client()
+
+        documents = "\n\n".join(
+            f"--- DOCUMENT {i + 1} ---\n\n{text}"
+            for i, text in enumerate(pdf_texts)
+        )
+
         message = client.messages.create(
-            model="claude-3-opus-20240229",
-            max_tokens=1000,
-            system=system_prompt,
+            model=MODEL,
+            max_tokens=min(4096, 1000 * len(pdf_texts)),
+            system=[{
+                "type": "text",
+                "text": BATCH_SYSTEM_PROMPT,
+                "cache_control": {"type": "ephemeral"}
+            }],
             messages=[{
                 "role": "user",
-                "content": user_prompt
+                "content": BATCH_USER_PROMPT_TEMPLATE.format(documents=documents)
             }]
         )
-        
-        # Extract and parse the response
+
         completion_text = message.content[0].text
-        return parse_ai_response(completion_text)
-        
+        try:
+            records = _loads(completion_text)
+        except json.JSONDecodeError:
+            records = extract_json_array_from_text(completion_text)
+
+        if (not isinstance(records, list) or len(records) != len(pdf_texts)
+                or not all(isinstance(record, dict) for record in records)):
+            # The model didn't return one object per document; fall back
+            # to individual requests rather than misattribute records
+            logger.warning("Batched response did not match document count, falling back to per-document extraction")
+            return [extract_shipping_data(text) for text in pdf_texts]
+
+        for record in records:
+            for field in REQUIRED_FIELDS:
+                if field not in record:
+                    record[field] = "Not Found"
+
+        return records
+
     except Exception as e:
-        logger.error(f"Anthropic extraction error: {str(e)}")
+        logger.error(f"Anthropic batch extraction error: {str(e)}")
         raise
 
 def parse_ai_response(text):
     """
     Parse the AI response to extract structured data.
     """
-    try:
-        # Try to parse directly as JSON
-        return json.loads(text)
-    except json.JSONDecodeError:
-        # Try to extract JSON from text
-        extracted_data = extract_json_from_text(text)
-        if extracted_data:
-            return extracted_data
-        
-        # If no JSON found, parse text response
-        logger.warning("Could not find valid JSON in response, attempting manual parsing")
-        extracted_data = parse_text_response(text)
-        
-        # Ensure all required fields are present
-        required_fields = ["Order ID", "Recipient Name", "Recipient Address", "Courier Name", "Tracking Number"]
-        for field in required_fields:
-            if field not in extracted_data:
-                extracted_data[field] = "Not Found"
-        
+    stripped = text.strip()
+
+    # Only try the direct parse when the text plausibly is a bare JSON
+    # object, so responses wrapped in prose skip straight to extraction
+    # without paying for a raised JSONDecodeError
+    if stripped.startswith('{') and stripped.endswith('}'):
+        try:
+            return _loads(stripped)
+        except json.JSONDecodeError:
+            pass
+
+    # Try to extract JSON from text
+    extracted_data = extract_json_from_text(text)
+    if extracted_data:
         return extracted_data
 
+    # If no JSON found, parse text response
+    logger.warning("Could not find valid JSON in response, attempting manual parsing")
+    extracted_data = parse_text_response(text)
+
+    # Ensure all required fields are present
+    for field in REQUIRED_FIELDS:
+        if field not in extracted_data:
+            extracted_data[field] = "Not Found"
+
+    return extracted_data
+
 def parse_text_response(text):
     """
     Fallback method to parse non-JSON response into structured data.
     """
     extracted_data = {}
-    field_patterns = {
-        "Order ID": ["order id", "order number", "order #", "id"],
-        "Recipient Name": ["recipient name", "receiver name", "consignee", "to:"],
-        "Recipient Address": ["recipient address", "delivery address", "shipping address", "destination"],
-        "Courier Name": ["courier name", "carrier", "shipping company", "delivery service"],
-        "Tracking Number": ["tracking number", "tracking #", "awb", "airway bill", "tracking id"]
-    }
-    
+
     # Clean up text
     text = text.replace("```", "").strip()
-    lines = text.split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        
-        # Try to find field labels and values
-        for field, patterns in field_patterns.items():
-            if field in extracted_data:
-                continue  # Skip if already found
-            
-            for pattern in patterns:
-                if pattern.lower() in line.lower():
-                    # Found a potential field
-                    parts = line.split(':', 1)
-                    if len(parts) > 1:
-                        value = parts[1].strip()
-                        extracted_data[field] = value if value else "Not Found"
-                        break
-    
+
+    # One multiline pass over the whole response; the first match for
+    # each field wins
+    for match in _FIELD_LABEL_RE.finditer(text):
+        for group_name, field in _FIELD_GROUPS.items():
+            if match.group(group_name) is not None and field not in extracted_data:
+                value = match.group('value').strip()
+                extracted_data[field] = value if value else "Not Found"
+                break
+
+        # Everything found - skip whatever boilerplate follows
+        if len(extracted_data) == len(_FIELD_GROUPS):
+            break
+
     # Set default values for any missing fields
-    for field in field_patterns.keys():
+    for field in REQUIRED_FIELDS:
         if field not in extracted_data:
             extracted_data[field] = "Not Found"
-    
+
     return extracted_data
@@ -0,0 +1,85 @@
+import os
+import hashlib
+import pickle
+import functools
+
+# Content-addressed disk cache for expensive, deterministic pipeline
+# steps (PDF text extraction, AI field extraction). Entries live under
+# CACHE_ROOT/<namespace>/<sha256>.pkl and are written atomically via a
+# temp file + os.replace, so a crash mid-write never leaves a corrupt
+# entry. Every operation is best-effort: cache failures fall through
+# to recomputing.
+CACHE_ROOT = ".cache"
+
+def make_key(parts):
+    """
+    Derive a cache key from the content identifying a computation.
+
+    Args:
+        parts (list): str/bytes values that together determine the result
+
+    Returns:
+        str: Hex SHA-256 digest of the concatenated parts
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+    return digest.hexdigest()
+
+def cache_get(namespace, key):
+    """
+    Return the cached value for key, or None if absent or unreadable.
+    """
+    try:
+        path = os.path.join(CACHE_ROOT, namespace, f"{key}.pkl")
+        with open(path, 'rb') as cache_file:
+            return pickle.load(cache_file)
+    except (OSError, pickle.PickleError):
+        return None
+
+def cache_put(namespace, key, value):
+    """
+    Store value under key, atomically and best-effort.
+    """
+    try:
+        directory = os.path.join(CACHE_ROOT, namespace)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{key}.pkl")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as cache_file:
+            pickle.dump(value, cache_file)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+def disk_cached(namespace, key_parts):
+    """
+    Decorator memoizing a function's results on disk.
+
+    Args:
+        namespace (str): Cache namespace under CACHE_ROOT
+        key_parts (callable): Maps the function's arguments to the list
+            of str/bytes parts identifying the computation
+
+    Returns:
+        callable: Decorator wrapping the function with the cache
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                key = make_key(key_parts(*args, **kwargs))
+            except Exception:
+                # Input we can't fingerprint (e.g. an unseekable
+                # stream): just compute without caching
+                return func(*args, **kwargs)
+
+            cached = cache_get(namespace, key)
+            if cached is not None:
+                return cached
+
+            result = func(*args, **kwargs)
+            cache_put(namespace, key, result)
+            return result
+        return wrapper
+    return decorator
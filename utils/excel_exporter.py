@@ -1,10 +1,7 @@
-import pandas as pd
 import io
 import logging
 from datetime import datetime
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def create_excel_file(df):
@@ -18,36 +15,38 @@ def create_excel_file(df):
         bytes: Excel file as bytes for download
     """
     logger.info("Creating Excel file from extracted data")
-    
+
+    # Deferred import: pandas is heavy and a caller that only needs
+    # generate_filename shouldn't pay for it
+    import pandas as pd
+
     try:
+        # Compute column widths on the DataFrame itself - one vectorized
+        # string-length pass per column instead of touching every
+        # openpyxl cell object
+        widths = {}
+        for col in df.columns:
+            max_length = int(df[col].astype(str).map(len).max()) if len(df) else 0
+            widths[col] = max(max_length, len(str(col))) + 2
+
         # Create a buffer to hold the Excel file
         buffer = io.BytesIO()
-        
-        # Create Excel writer using the buffer
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+
+        # Create Excel writer using the buffer. xlsxwriter in
+        # constant_memory mode streams rows as they are written, so
+        # peak memory stays flat no matter how many records we export
+        with pd.ExcelWriter(
+            buffer,
+            engine='xlsxwriter',
+            engine_kwargs={'options': {'constant_memory': True}}
+        ) as writer:
             # Write the DataFrame to the Excel file
             df.to_excel(writer, sheet_name='Shipping Data', index=False)
-            
-            # Access the workbook and the worksheet
-            workbook = writer.book
+
+            # Set the column widths (with some padding) for readability
             worksheet = writer.sheets['Shipping Data']
-            
-            # Format the columns for better readability
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                
-                # Find the maximum length in the column
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                
-                # Set the column width based on the maximum length (with some padding)
-                adjusted_width = max_length + 2
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+            for i, col in enumerate(df.columns):
+                worksheet.set_column(i, i, widths[col])
         
         # Set the buffer position to the beginning
         buffer.seek(0)
@@ -87,6 +86,8 @@ def create_multiple_records_excel(data_list):
     Returns:
         bytes: Excel file as bytes for download
     """
+    import pandas as pd
+
     # Convert list of records to DataFrame
     df = pd.DataFrame(data_list)
     